@@ -3,16 +3,20 @@ Course Recommendation System - Professional Dashboard
 Created by: Shashank
 """
 
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import pickle
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.decomposition import NMF
+from scipy.sparse import csr_matrix, hstack, vstack
+
+from ranking import dequantize_rows, quantize_rows, quantized_nbytes, score_rows, top_k_indices
+from sharding import ShardCoordinator
+# scikit-learn is imported inside the model loaders so pages without models skip it
 
 # Page configuration
 st.set_page_config(
@@ -150,26 +154,239 @@ def load_data():
         st.error("❌ Dataset not found! Please ensure 'processed_courses.csv' is in the same directory.")
         return None
 
+# Course attributes users can filter on, besides the price cap
+FILTER_COLUMNS = ['difficulty_level', 'certification_offered', 'study_material_available']
+
+def build_filter_masks(df_unique, n_price_buckets=4):
+    """Precompute a boolean mask per attribute value and price cap, aligned with df_unique"""
+    masks = {
+        column: {value: (df_unique[column] == value).values for value in df_unique[column].dropna().unique()}
+        for column in FILTER_COLUMNS if column in df_unique.columns
+    }
+    prices = df_unique['course_price'].to_numpy(dtype=float)
+    caps = np.unique(np.nanquantile(prices, np.linspace(0, 1, n_price_buckets + 1)[1:]))
+    masks['max_price'] = {float(cap): prices <= cap for cap in caps}
+    return masks
+
+def filter_mask(models, filters):
+    """Combine the precomputed masks for the chosen filters (None when unfiltered)"""
+    mask = None
+    for column, value in (filters or {}).items():
+        if value is None:
+            continue
+        selected = models['filter_masks'][column][value]
+        mask = selected if mask is None else mask & selected
+    return mask
+
+def _als_solve(fixed, confidence, regularization, n_threads, block_size=2048):
+    """Solve the implicit ALS normal equations for every row of `confidence`.
+
+    Each row u needs (YtY + Yt(Cu - I)Y + reg*I) x_u = Yt Cu p_u. The shared
+    YtY term is computed once; the per-row corrections only touch observed
+    entries, so a block of rows is assembled one factor column at a time with
+    reduceat (temporaries stay nnz x f, never nnz x f x f) and solved with a
+    single batched np.linalg.solve. Blocks run on a thread pool (LAPACK
+    releases the GIL) with BLAS limited to one thread, so the two don't
+    oversubscribe the CPU.
+    """
+    from threadpoolctl import threadpool_limits
+    
+    n_rows, n_factors = confidence.shape[0], fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(n_factors)
+    solved = np.zeros((n_rows, n_factors))
+
+    def solve_block(start):
+        stop = min(start + block_size, n_rows)
+        block = confidence[start:stop]
+        A = np.repeat(gram[None, :, :], stop - start, axis=0)
+        b = np.zeros((stop - start, n_factors))
+        counts = np.diff(block.indptr)
+        observed = np.flatnonzero(counts)
+        if len(observed):
+            y = fixed[block.indices]
+            c = block.data[:, None]
+            offsets = block.indptr[observed]
+            weighted = y * (c - 1)
+            for i in range(n_factors):
+                A[observed, i] += np.add.reduceat(weighted[:, i, None] * y, offsets, axis=0)
+            b[observed] = np.add.reduceat(y * c, offsets, axis=0)
+        solved[start:stop] = np.linalg.solve(A, b[:, :, None])[:, :, 0]
+
+    with threadpool_limits(limits=1, user_api='blas'), ThreadPoolExecutor(max_workers=n_threads) as pool:
+        list(pool.map(solve_block, range(0, n_rows, block_size)))
+    return solved
+
+def train_implicit_als(df, course_ids, confidence_col='time_spent_hours', n_factors=20,
+                       regularization=0.1, alpha=10.0, iterations=15, n_threads=None,
+                       random_state=42):
+    """Train ALS for implicit feedback on the sparse user-item confidence matrix.
+
+    Every observed (user, course) pair is a positive preference with confidence
+    1 + alpha * log1p(confidence_col); unobserved pairs keep confidence 1 and
+    preference 0 without ever being materialised. Item factors follow the
+    order of `course_ids`.
+    """
+    user_index = pd.Index(df['user_id'].unique())
+    course_index = pd.Index(course_ids)
+    rows = user_index.get_indexer(df['user_id'])
+    cols = course_index.get_indexer(df['course_id'])
+    confidence = 1.0 + alpha * np.log1p(df[confidence_col].clip(lower=0).to_numpy(dtype=float))
+    interactions = csr_matrix(
+        (confidence, (rows, cols)), shape=(len(user_index), len(course_index))
+    )
+    interactions.sum_duplicates()
+    interactions_t = interactions.T.tocsr()
+
+    n_threads = n_threads or os.cpu_count() or 1
+    rng = np.random.default_rng(random_state)
+    item_factors = rng.normal(scale=0.01, size=(len(course_index), n_factors))
+    user_factors = np.zeros((len(user_index), n_factors))
+    for _ in range(iterations):
+        user_factors = _als_solve(item_factors, interactions, regularization, n_threads)
+        item_factors = _als_solve(user_factors, interactions_t, regularization, n_threads)
+
+    return {
+        'user_index': user_index,
+        'user_factors': user_factors,
+        'item_factors': item_factors,
+        'interactions': interactions,
+        # What fold_in_user_factors needs to place a new user without retraining
+        'gram': item_factors.T @ item_factors + regularization * np.eye(n_factors),
+        'default_confidence': float(np.median(confidence))
+    }
+
+def quantized_similarity(features, precision='float64', block_size=512):
+    """All-pairs cosine similarity of L2-normalised rows, computed and quantized in row blocks.
+
+    Only one block_size x N float64 block exists at a time, so int8 and
+    float32 never build the full float64 matrix first.
+    """
+    n = features.shape[0]
+    features_t = features.T.tocsr()
+    values = np.empty((n, n), dtype=np.int8 if precision == 'int8' else precision)
+    scales = np.empty(n, dtype=np.float32) if precision == 'int8' else None
+    for start in range(0, n, block_size):
+        block = quantize_rows((features[start:start + block_size] @ features_t).toarray(), precision)
+        values[start:start + block_size] = block['values']
+        if scales is not None:
+            scales[start:start + block_size] = block['scales']
+    return {'values': values, 'scales': scales}
+
+# Numeric course columns appended to the hashed text features
+CONTENT_NUMERIC_COLS = [
+    'course_duration_hours', 'course_price', 'cert_offered_enc',
+    'difficulty_level_enc', 'feedback_score'
+]
+
+def content_text(chunk):
+    """Text describing each course for the hashed TF-IDF block"""
+    return chunk['course_name'] + ' ' + chunk['instructor'] + ' ' + chunk['difficulty_level']
+
+def fit_content_pipeline(chunks, n_features=2**18, numeric_weight=0.5):
+    """Fit the hashed TF-IDF + numeric content pipeline over an iterable of course chunks.
+
+    Only document frequencies (one array of n_features) and numeric min/max are
+    kept between chunks, so memory does not grow with the catalog and no
+    vocabulary is stored.
+    """
+    from sklearn.feature_extraction.text import HashingVectorizer
+    
+    hasher = HashingVectorizer(
+        n_features=n_features, stop_words='english', alternate_sign=False, norm=None
+    )
+    doc_freq = np.zeros(n_features, dtype=np.int64)
+    n_docs = 0
+    numeric_cols, numeric_min, numeric_max = None, None, None
+    for chunk in chunks:
+        counts = hasher.transform(content_text(chunk))
+        doc_freq += np.bincount(counts.indices, minlength=n_features)
+        n_docs += counts.shape[0]
+        if numeric_cols is None:
+            numeric_cols = [c for c in CONTENT_NUMERIC_COLS if c in chunk.columns]
+            numeric_min = np.full(len(numeric_cols), np.inf)
+            numeric_max = np.full(len(numeric_cols), -np.inf)
+        values = chunk[numeric_cols].to_numpy(dtype=float)
+        numeric_min = np.minimum(numeric_min, np.nanmin(values, axis=0))
+        numeric_max = np.maximum(numeric_max, np.nanmax(values, axis=0))
+
+    return {
+        'hasher': hasher,
+        'idf': np.log((1 + n_docs) / (1 + doc_freq)) + 1,  # same smoothing as TfidfVectorizer
+        'numeric_cols': numeric_cols,
+        'numeric_min': numeric_min,
+        'numeric_range': np.where(numeric_max > numeric_min, numeric_max - numeric_min, 1.0),
+        'numeric_weight': numeric_weight
+    }
+
+def transform_content_features(pipeline, chunk):
+    """L2-normalised sparse content vectors for a chunk of (possibly new) courses"""
+    from sklearn.preprocessing import normalize
+    
+    text = normalize(pipeline['hasher'].transform(content_text(chunk)).multiply(pipeline['idf']))
+    scaled = (chunk[pipeline['numeric_cols']].to_numpy(dtype=float) - pipeline['numeric_min']) / pipeline['numeric_range']
+    scaled = np.nan_to_num(np.clip(scaled, 0.0, 1.0))
+    # The numeric block's norm is at most numeric_weight, so text stays dominant
+    numeric = csr_matrix(scaled * pipeline['numeric_weight'] / np.sqrt(max(len(pipeline['numeric_cols']), 1)))
+    return normalize(hstack([text, numeric], format='csr'))
+
+def iter_chunks(frame, chunk_size=5000):
+    """Yield consecutive row slices of a DataFrame"""
+    for start in range(0, len(frame), chunk_size):
+        yield frame.iloc[start:start + chunk_size]
+
 @st.cache_resource
-def load_models(df):
-    """Load or train models"""
+def load_catalog(df):
+    """Unique courses, lookups and precomputed masks (no model training)"""
     # Create unique courses dataframe
     df_unique = df.drop_duplicates(subset='course_id')
     
-    # Content-Based: TF-IDF
-    df_unique['combined_features'] = (
-        df_unique['course_name'] + ' ' + 
-        df_unique['instructor'] + ' ' + 
-        df_unique['difficulty_level']
-    )
-    tfidf = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = tfidf.fit_transform(df_unique['combined_features'])
-    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
+    # Create course indices (row positions in df_unique)
+    indices = pd.Series(np.arange(len(df_unique)), index=df_unique['course_id']).to_dict()
     
-    # Create course indices
-    indices = pd.Series(df_unique.index, index=df_unique['course_id']).to_dict()
+    # Cold start: per-course profile signals, aligned with df_unique
+    by_course = df.groupby('course_id')['previous_courses_taken'].mean()
+    experience = by_course.reindex(df_unique['course_id']).fillna(by_course.mean()).values
+    enrollment = df_unique['enrollment_numbers'].to_numpy(dtype=float)
+    cold_start = {
+        'popularity': enrollment / max(enrollment.max(), 1.0),
+        'difficulty': df_unique['difficulty_level'].values,
+        'experience': experience,
+        'experience_range': max(np.ptp(experience), 1.0)
+    }
     
-    # Collaborative: NMF
+    return {
+        'df_unique': df_unique,
+        'indices': indices,
+        # Course names repeat across course_ids; one code per name, aligned with df_unique
+        'name_codes': pd.factorize(df_unique['course_name'])[0],
+        'user_index': pd.Index(df['user_id'].unique()),
+        'cold_start': cold_start,
+        'filter_masks': build_filter_masks(df_unique)
+    }
+
+@st.cache_resource
+def load_content_features(df):
+    """Content-Based: hashed TF-IDF + scaled numeric features, built chunk by chunk"""
+    df_unique = load_catalog(df)['df_unique']
+    content_pipeline = fit_content_pipeline(iter_chunks(df_unique))
+    content_features = vstack([
+        transform_content_features(content_pipeline, chunk) for chunk in iter_chunks(df_unique)
+    ], format='csr')
+    return {'content_pipeline': content_pipeline, 'content_features': content_features}
+
+# Only the similarity matrix for the current precision is kept; it is N x N
+@st.cache_resource(max_entries=1)
+def load_content_similarity(df, precision='float64'):
+    """Content-Based: all-pairs cosine similarity of the content features"""
+    content_features = load_content_features(df)['content_features']
+    return {'cosine_sim': quantized_similarity(content_features, precision)}
+
+@st.cache_resource
+def train_nmf_model(df):
+    """Collaborative: NMF on the explicit rating matrix (float64, trained once)"""
+    from sklearn.decomposition import NMF
+    
+    df_unique = load_catalog(df)['df_unique']
     user_item_matrix = df.pivot_table(
         index='user_id', 
         columns='course_id', 
@@ -177,84 +394,258 @@ def load_models(df):
         fill_value=0
     )
     
+    start = time.perf_counter()
     nmf_model = NMF(n_components=20, init='random', random_state=42, max_iter=200)
     user_features = nmf_model.fit_transform(user_item_matrix)
-    course_features = nmf_model.components_
-    predicted_ratings = np.dot(user_features, course_features)
-    predicted_ratings_df = pd.DataFrame(
-        predicted_ratings,
-        index=user_item_matrix.index,
-        columns=user_item_matrix.columns
-    )
-    
+    # Course factors as rows, aligned with df_unique; ratings are predicted per query
+    course_features = pd.DataFrame(
+        nmf_model.components_.T, index=user_item_matrix.columns
+    ).reindex(df_unique['course_id'], fill_value=0).values
     return {
-        'df_unique': df_unique,
-        'cosine_sim': cosine_sim,
-        'indices': indices,
-        'predicted_ratings_df': predicted_ratings_df,
-        'user_item_matrix': user_item_matrix
+        'user_index': user_item_matrix.index,
+        'user_factors': user_features,
+        'course_factors': course_features,
+        'training_seconds': time.perf_counter() - start
     }
 
-def get_content_recommendations(course_id, models, top_n=10):
+@st.cache_resource
+def load_nmf_model(df, precision='float64'):
+    """Collaborative: NMF factors stored at `precision`"""
+    nmf = dict(train_nmf_model(df))
+    nmf['user_factors'] = quantize_rows(nmf['user_factors'], precision)
+    nmf['course_factors'] = quantize_rows(nmf['course_factors'], precision)
+    return {'nmf': nmf}
+
+@st.cache_resource
+def train_als_model(df):
+    """Collaborative: implicit ALS, confidence from time spent (float64, trained once)"""
+    df_unique = load_catalog(df)['df_unique']
+    start = time.perf_counter()
+    als = train_implicit_als(df, df_unique['course_id'].values)
+    als['training_seconds'] = time.perf_counter() - start
+    return als
+
+@st.cache_resource
+def load_als_model(df, precision='float64'):
+    """Collaborative: ALS factors stored at `precision`"""
+    als = dict(train_als_model(df))
+    als['user_factors'] = quantize_rows(als['user_factors'], precision)
+    als['item_factors'] = quantize_rows(als['item_factors'], precision)
+    return {'als': als}
+
+# One set of workers at a time; evicted coordinators stop their workers
+@st.cache_resource(max_entries=1)
+def load_shard_workers(df, n_shards):
+    """Serving: local shard worker processes, loaded per engine on first query"""
+    return {'shards': ShardCoordinator.start_local(n_shards)}
+
+# Which cached loader produces each model key
+MODEL_LOADERS = {}
+for _keys, _loader in [
+    (('df_unique', 'indices', 'name_codes', 'user_index', 'cold_start', 'filter_masks'),
+     lambda models: load_catalog(models.df)),
+    (('content_pipeline', 'content_features'), lambda models: load_content_features(models.df)),
+    (('cosine_sim',), lambda models: load_content_similarity(models.df, models['precision'])),
+    (('nmf',), lambda models: load_nmf_model(models.df, models['precision'])),
+    (('als',), lambda models: load_als_model(models.df, models['precision'])),
+    (('shards',), lambda models: load_shard_workers(models.df, models['n_shards']))
+]:
+    MODEL_LOADERS.update(dict.fromkeys(_keys, _loader))
+
+class LazyModels(dict):
+    """Models dict whose components are loaded (and cached) on first lookup"""
+    
+    def __init__(self, df, precision='float64', n_shards=1):
+        super().__init__(precision=precision, n_shards=n_shards)
+        self.df = df
+    
+    def __missing__(self, key):
+        self.update(MODEL_LOADERS[key](self))
+        return dict.__getitem__(self, key)
+
+def load_models(df, precision='float64', n_shards=1):
+    """Load or train models on demand, storing similarities and factors at `precision`.
+
+    With n_shards > 1, content, NMF and ALS top-k queries are answered by
+    shard workers instead of the in-process matrices.
+    """
+    return LazyModels(df, precision, n_shards)
+
+# Rows each sharded engine serves, one per course
+SHARDED_MATRICES = {
+    'content': lambda models: models['content_features'],
+    'nmf': lambda models: models['nmf']['course_factors'],
+    'als': lambda models: models['als']['item_factors']
+}
+
+def sharded_top_k(models, engine, query, top_n, mask=None, exclude=()):
+    """Top-k from the shard workers, sending them the engine's rows on first use"""
+    shards = models['shards']
+    # Factors are stored per precision, so sessions at different precisions share workers
+    name = engine if engine == 'content' else f"{engine}-{models['precision']}"
+    if name not in shards.loaded:
+        shards.load(name, SHARDED_MATRICES[engine](models))
+    return shards.top_k(name, query, top_n, mask, exclude)
+
+def model_nbytes(models):
+    """Memory held by the loaded similarity and factor matrices"""
+    matrices = []
+    if 'cosine_sim' in models:
+        matrices.append(models['cosine_sim'])
+    for engine, item_key in [('nmf', 'course_factors'), ('als', 'item_factors')]:
+        if engine in models:
+            matrices += [models[engine]['user_factors'], models[engine][item_key]]
+    return sum(quantized_nbytes(q) for q in matrices)
+
+def get_content_recommendations(course_id, models, top_n=10, mask=None):
     """Get content-based recommendations"""
     try:
         idx = models['indices'][course_id]
-        sim_scores = list(enumerate(models['cosine_sim'][idx]))
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-        sim_scores = sim_scores[1:top_n+1]
-        course_indices = [i[0] for i in sim_scores]
+        if models['n_shards'] > 1:
+            course_indices, top_scores = sharded_top_k(
+                models, 'content', models['content_features'][idx], top_n, mask, exclude=[idx]
+            )
+        else:
+            sim_scores = dequantize_rows(models['cosine_sim'], idx).astype(np.float64)
+            sim_scores[idx] = -np.inf  # skip the course itself
+            course_indices = top_k_indices(sim_scores, top_n, mask)
+            top_scores = sim_scores[course_indices]
         
         recommendations = models['df_unique'].iloc[course_indices][[
             'course_id', 'course_name', 'instructor', 'difficulty_level', 
             'rating', 'course_price'
         ]].copy()
-        recommendations['similarity_score'] = [score[1] for score in sim_scores]
+        recommendations['similarity_score'] = top_scores
         return recommendations
     except:
         return pd.DataFrame()
 
-def get_collaborative_recommendations(user_id, models, top_n=10):
-    """Get collaborative filtering recommendations"""
+def same_name_positions(models, positions):
+    """Positions of every course sharing a name with any of `positions`"""
+    name_codes = models['name_codes']
+    return np.flatnonzero(np.isin(name_codes, name_codes[positions]))
+
+def is_known_user(user_id, models):
+    """Whether the collaborative models have trained factors for this user"""
+    return user_id in models['user_index']
+
+def fold_in_user_factors(als, course_positions):
+    """Closed-form ALS user vector for a set of taken courses, item factors fixed"""
+    y = dequantize_rows(als['item_factors'], course_positions).astype(np.float64)
+    c = als['default_confidence']
+    A = als['gram'] + (c - 1) * (y.T @ y)
+    b = c * y.sum(axis=0)
+    return np.linalg.solve(A, b)
+
+def get_cold_start_recommendations(models, taken_course_ids=(), previous_courses_taken=None,
+                                   difficulty_level=None, top_n=10, mask=None):
+    """Get recommendations for a user the models were not trained on"""
     try:
-        if user_id not in models['predicted_ratings_df'].index:
-            return pd.DataFrame()
+        profile = models['cold_start']
+        taken = np.array(
+            [models['indices'][c] for c in taken_course_ids if c in models['indices']], dtype=int
+        )
         
-        user_predictions = models['predicted_ratings_df'].loc[user_id]
-        top_course_ids = user_predictions.nlargest(top_n*3).index  # Get more to filter out duplicates
+        # Every signal is in [0, 1] and the weights sum to 1
+        scores = 0.2 * profile['popularity']
+        if len(taken):
+            user_vector = fold_in_user_factors(models['als'], taken)
+            collab = score_rows(models['als']['item_factors'], user_vector)
+            collab = collab / max(np.abs(collab).max(), 1e-12)
+            content = dequantize_rows(models['cosine_sim'], taken).mean(axis=0)
+            scores = scores + 0.3 * collab + 0.3 * content
+        if difficulty_level is not None:
+            scores = scores + 0.1 * (profile['difficulty'] == difficulty_level)
+        if previous_courses_taken is not None:
+            gap = np.abs(profile['experience'] - previous_courses_taken) / profile['experience_range']
+            scores = scores + 0.1 * (1.0 - np.minimum(gap, 1.0))
         
-        # Use df_unique to avoid duplicates
-        recommendations = models['df_unique'][
-            models['df_unique']['course_id'].isin(top_course_ids)
-        ].copy()
+        scores = np.asarray(scores, dtype=np.float64)
+        # Other copies of a taken course are the same course
+        scores[same_name_positions(models, taken)] = -np.inf
+        top = top_k_indices(scores, top_n, mask)
         
-        # Add estimated ratings
-        recommendations['estimated_rating'] = recommendations['course_id'].map(
-            lambda x: min(5.0, max(1.0, user_predictions[x]))
-        )
+        recommendations = models['df_unique'].iloc[top][[
+            'course_id', 'course_name', 'instructor', 'difficulty_level',
+            'rating', 'course_price'
+        ]].copy()
+        recommendations['cold_start_score'] = scores[top]
+        return recommendations
+    except:
+        return pd.DataFrame()
+
+def get_collaborative_recommendations(user_id, models, top_n=10, profile=None, mask=None):
+    """Get collaborative filtering recommendations"""
+    try:
+        # Checked against the catalog first, so unknown users never load the NMF model
+        if not is_known_user(user_id, models):
+            return get_cold_start_recommendations(models, top_n=top_n, mask=mask, **(profile or {}))
         
-        # Sort and get top N unique courses (by course_id only)
-        recommendations = recommendations.sort_values('estimated_rating', ascending=False).head(top_n)
+        nmf = models['nmf']
+        user_pos = nmf['user_index'].get_indexer([user_id])[0]
+        user_vector = dequantize_rows(nmf['user_factors'], user_pos)
+        if models['n_shards'] > 1:
+            top, top_scores = sharded_top_k(models, 'nmf', user_vector, top_n, mask)
+        else:
+            user_predictions = score_rows(nmf['course_factors'], user_vector)
+            top = top_k_indices(user_predictions, top_n, mask)
+            top_scores = user_predictions[top]
+        
+        recommendations = models['df_unique'].iloc[top].copy()
+        # Raw predictions are tiny on this sparse matrix and all clip to 1.0 for display,
+        # so keep the unclipped score to rank by
+        recommendations['nmf_score'] = top_scores
+        recommendations['estimated_rating'] = np.clip(top_scores, 1.0, 5.0)
         
         return recommendations[[
             'course_id', 'course_name', 'instructor', 'difficulty_level',
-            'rating', 'estimated_rating', 'course_price'
+            'rating', 'estimated_rating', 'nmf_score', 'course_price'
         ]]
     except:
         return pd.DataFrame()
 
-def get_hybrid_recommendations(user_id, models, top_n=10):
+def get_als_recommendations(user_id, models, top_n=10, profile=None, mask=None):
+    """Get collaborative recommendations from the implicit ALS factors"""
+    try:
+        # Checked against the catalog first, so unknown users never load the ALS model
+        if not is_known_user(user_id, models):
+            return get_cold_start_recommendations(models, top_n=top_n, mask=mask, **(profile or {}))
+        
+        als = models['als']
+        user_pos = als['user_index'].get_indexer([user_id])[0]
+        user_vector = dequantize_rows(als['user_factors'], user_pos)
+        # Don't recommend courses the user already took
+        seen = als['interactions'][user_pos].indices
+        if models['n_shards'] > 1:
+            top, top_scores = sharded_top_k(models, 'als', user_vector, top_n, mask, exclude=seen)
+        else:
+            scores = score_rows(als['item_factors'], user_vector).astype(np.float64)
+            scores[seen] = -np.inf
+            top = top_k_indices(scores, top_n, mask)
+            top_scores = scores[top]
+        
+        recommendations = models['df_unique'].iloc[top][[
+            'course_id', 'course_name', 'instructor', 'difficulty_level',
+            'rating', 'course_price'
+        ]].copy()
+        recommendations['als_score'] = top_scores
+        return recommendations
+    except:
+        return pd.DataFrame()
+
+def get_hybrid_recommendations(user_id, models, top_n=10, profile=None, mask=None):
     """Get hybrid recommendations"""
     try:
         # Get user's top rated course
         user_courses = df[df['user_id'] == user_id].sort_values('rating', ascending=False)
         if len(user_courses) == 0:
-            return get_collaborative_recommendations(user_id, models, top_n)
+            return get_collaborative_recommendations(user_id, models, top_n, profile, mask)
         
         last_course = user_courses.iloc[0]['course_id']
         
         # Get both types with more results to handle deduplication
-        content_recs = get_content_recommendations(last_course, models, top_n*3)
-        collab_recs = get_collaborative_recommendations(user_id, models, top_n*3)
+        content_recs = get_content_recommendations(last_course, models, top_n*3, mask)
+        collab_recs = get_collaborative_recommendations(user_id, models, top_n*3, mask=mask)
         
         if content_recs.empty or collab_recs.empty:
             return collab_recs if not collab_recs.empty else content_recs
@@ -289,19 +680,75 @@ def get_hybrid_recommendations(user_id, models, top_n=10):
     except:
         return pd.DataFrame()
 
-def get_popular_recommendations(df_unique, top_n=10):
+# Rolling per-user session: a ring buffer of recent course positions
+SESSION_LENGTH = 20
+SESSION_DECAY = 0.8
+
+def new_session(length=SESSION_LENGTH):
+    """Empty session holding up to `length` recent course positions"""
+    return {'courses': np.zeros(length, dtype=np.int32), 'count': 0}
+
+def record_event(session, course_position):
+    """Add a course to the session in O(1), overwriting the oldest once full"""
+    session['courses'][session['count'] % len(session['courses'])] = course_position
+    session['count'] += 1
+
+def session_courses(session, decay=SESSION_DECAY):
+    """Buffered course positions, newest first, with weights decay ** age"""
+    length = len(session['courses'])
+    ages = np.arange(min(session['count'], length))
+    return session['courses'][(session['count'] - 1 - ages) % length], decay ** ages
+
+def get_session_recommendations(user_id, models, session, top_n=10, mask=None, content_weight=0.5):
+    """Recommend from the user's recent courses (decayed neighbours) plus their ALS factors"""
+    try:
+        courses, weights = session_courses(session)
+        if len(courses) == 0:
+            return get_als_recommendations(user_id, models, top_n, mask=mask)
+        
+        # Neighbour vectors of the recent courses, most recent weighted highest
+        content = (weights / weights.sum()) @ dequantize_rows(models['cosine_sim'], courses)
+        
+        als = models['als']
+        user_pos = als['user_index'].get_indexer([user_id])[0]
+        if user_pos >= 0:
+            user_vector = dequantize_rows(als['user_factors'], user_pos)
+            seen = als['interactions'][user_pos].indices
+        else:
+            # New users: the session itself is the only history
+            user_vector = fold_in_user_factors(als, np.unique(courses))
+            seen = np.array([], dtype=int)
+        collab = score_rows(als['item_factors'], user_vector).astype(np.float64)
+        collab = collab / max(np.abs(collab).max(), 1e-12)
+        
+        scores = content_weight * content + (1 - content_weight) * collab
+        # Every copy of a course in the session or already taken
+        scores[same_name_positions(models, np.concatenate([courses, seen]))] = -np.inf
+        top = top_k_indices(scores, top_n, mask)
+        
+        recommendations = models['df_unique'].iloc[top][[
+            'course_id', 'course_name', 'instructor', 'difficulty_level',
+            'rating', 'course_price'
+        ]].copy()
+        recommendations['session_score'] = scores[top]
+        return recommendations
+    except:
+        return pd.DataFrame()
+
+def get_popular_recommendations(df_unique, top_n=10, mask=None):
     """Get most popular courses by enrollment"""
     # Ensure unique courses
     popular = df_unique.drop_duplicates(subset='course_id')
-    return popular.nlargest(top_n, 'enrollment_numbers')[[
+    top = top_k_indices(popular['enrollment_numbers'].to_numpy(dtype=float), top_n, mask)
+    return popular.iloc[top][[
         'course_id', 'course_name', 'instructor', 'difficulty_level',
         'rating', 'enrollment_numbers', 'course_price'
     ]]
 
-def get_trending_recommendations(df, top_n=10):
+def get_trending_recommendations(df, top_n=10, mask=None):
     """Get trending courses (high recent engagement)"""
-    # Group by course to get unique courses
-    trending = df.groupby('course_id').agg({
+    # Group by course in order of first appearance, so rows line up with df_unique (and mask)
+    trending = df.groupby('course_id', sort=False).agg({
         'enrollment_numbers': 'mean',
         'rating': 'mean',
         'course_name': 'first',
@@ -311,27 +758,151 @@ def get_trending_recommendations(df, top_n=10):
     }).reset_index()
     
     trending['trend_score'] = trending['enrollment_numbers'] * trending['rating']
-    return trending.nlargest(top_n, 'trend_score')[[
+    top = top_k_indices(trending['trend_score'].to_numpy(dtype=float), top_n, mask)
+    return trending.iloc[top][[
         'course_id', 'course_name', 'instructor', 'difficulty_level',
-        'rating', 'enrollment_numbers', 'course_price'
+        'rating', 'enrollment_numbers', 'course_price', 'trend_score'
     ]]
 
-def get_top_rated_recommendations(df_unique, top_n=10):
+def get_top_rated_recommendations(df_unique, top_n=10, mask=None):
     """Get highest rated courses"""
     # Ensure unique courses
     top_rated = df_unique.drop_duplicates(subset='course_id')
-    top_rated = top_rated[top_rated['rating'] >= 4.5].nlargest(top_n, 'rating')
-    return top_rated[[
+    ratings = top_rated['rating'].to_numpy(dtype=float)
+    top = top_k_indices(np.where(ratings >= 4.5, ratings, -np.inf), top_n, mask)
+    # Ranked by rating alone, so no enrollment column to compete as its relevance score
+    return top_rated.iloc[top][[
         'course_id', 'course_name', 'instructor', 'difficulty_level',
-        'rating', 'enrollment_numbers', 'course_price'
+        'rating', 'course_price'
     ]]
 
+# The column each strategy ranks by; every strategy returns exactly one of these
+# ahead of the fallbacks (Popular ranks by enrollment, Top Rated by rating)
+RELEVANCE_COLUMNS = [
+    'nmf_score', 'als_score', 'cold_start_score', 'session_score', 'hybrid_score',
+    'similarity_score', 'trend_score', 'enrollment_numbers', 'rating'
+]
+
+def mmr_rerank(recommendations, models, top_n=10, mmr_lambda=0.7):
+    """Re-rank any strategy's candidates with maximal marginal relevance.
+
+    Relevance is the strategy's own score divided by its maximum; redundancy is the
+    highest content similarity to an already selected course. Candidate vectors
+    are densified over the few hashed columns they use, and the maximum is
+    updated with one matrix-vector product per pick: O(top_n * candidates).
+    """
+    if recommendations.empty or mmr_lambda >= 1.0:
+        return recommendations.head(top_n)
+    
+    score_col = next((c for c in RELEVANCE_COLUMNS if c in recommendations.columns), None)
+    relevance = None if score_col is None else recommendations[score_col].to_numpy(dtype=float)
+    if relevance is None or np.ptp(relevance) == 0:
+        relevance = np.arange(len(recommendations), 0, -1, dtype=float)  # input order
+    relevance = relevance / max(np.abs(relevance).max(), 1e-12)
+    
+    positions = [models['indices'][c] for c in recommendations['course_id']]
+    features = models['content_features'][positions]
+    features = features[:, np.unique(features.indices)].toarray()
+    max_sim = np.zeros(len(positions))
+    available = np.ones(len(positions), dtype=bool)
+    order = []
+    for _ in range(min(top_n, len(positions))):
+        mmr = np.where(available, mmr_lambda * relevance - (1 - mmr_lambda) * max_sim, -np.inf)
+        best = int(np.argmax(mmr))
+        order.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, features @ features[best])
+    return recommendations.iloc[order]
+
+def intra_list_diversity(recommendations, models):
+    """1 - mean pairwise content similarity of a recommendation list"""
+    if len(recommendations) < 2:
+        return 0.0
+    features = models['content_features'][[models['indices'][c] for c in recommendations['course_id']]]
+    sims = (features @ features.T).toarray()
+    n = len(sims)
+    return 1.0 - (sims.sum() - np.trace(sims)) / (n * (n - 1))
+
+# Chart data layer: aggregate on the server so figures carry summaries, not raw rows
+@st.cache_data
+def histogram_data(df, column, nbins=50):
+    """Bin a column with NumPy (unit-width bins for small integer ranges)"""
+    values = df[column].dropna().to_numpy()
+    if values.size == 0:
+        return pd.DataFrame(columns=['bin_center', 'bin_width', 'count'])
+    low, high = values.min(), values.max()
+    if np.issubdtype(values.dtype, np.integer) and high - low + 1 <= nbins:
+        edges = np.arange(low, high + 2) - 0.5
+    else:
+        edges = np.histogram_bin_edges(values, bins=nbins)
+    counts, edges = np.histogram(values, bins=edges)
+    return pd.DataFrame({
+        'bin_center': (edges[:-1] + edges[1:]) / 2,
+        'bin_width': np.diff(edges),
+        'count': counts
+    })
+
+@st.cache_data
+def box_stats(df, by, column):
+    """Quartiles and Tukey whiskers of a column per group"""
+    rows = []
+    for group, values in df.groupby(by)[column]:
+        values = values.dropna().to_numpy()
+        if values.size == 0:
+            continue
+        q1, median, q3 = np.percentile(values, [25, 50, 75])
+        iqr = q3 - q1
+        rows.append({
+            by: group, 'q1': q1, 'median': median, 'q3': q3, 'mean': values.mean(),
+            'lowerfence': values[values >= q1 - 1.5 * iqr].min(),
+            'upperfence': values[values <= q3 + 1.5 * iqr].max()
+        })
+    return pd.DataFrame(rows)
+
+@st.cache_data
+def stratified_sample(df, by, n=1000, random_state=42):
+    """Sample about n rows, keeping each group's share of the data"""
+    if len(df) <= n:
+        return df
+    rng = np.random.default_rng(random_state)
+    codes, _ = pd.factorize(df[by])
+    picked = []
+    for group in range(codes.max() + 1):
+        members = np.flatnonzero(codes == group)
+        picked.append(rng.choice(members, size=int(round(len(members) * n / len(df))), replace=False))
+    return df.iloc[np.sort(np.concatenate(picked))]
+
+def histogram_figure(df, column, nbins, title):
+    """Histogram drawn from pre-binned counts"""
+    hist = histogram_data(df, column, nbins)
+    fig = px.bar(
+        hist, x='bin_center', y='count',
+        title=title,
+        labels={'bin_center': column},
+        color_discrete_sequence=['#667eea']
+    )
+    fig.update_traces(width=hist['bin_width'].values)
+    fig.update_layout(bargap=0)
+    return fig
+
+def box_figure(df, by, column, title, colors):
+    """Box plot drawn from precomputed quartiles"""
+    stats = box_stats(df, by, column)
+    fig = go.Figure()
+    for i, row in enumerate(stats.itertuples(index=False)):
+        fig.add_trace(go.Box(
+            name=str(getattr(row, by)),
+            q1=[row.q1], median=[row.median], q3=[row.q3], mean=[row.mean],
+            lowerfence=[row.lowerfence], upperfence=[row.upperfence],
+            marker_color=colors[i % len(colors)]
+        ))
+    fig.update_layout(title=title, xaxis_title=by, yaxis_title=column)
+    return fig
+
 # Load data
 df = load_data()
 
 if df is not None:
-    models = load_models(df)
-    
     # Header
     st.markdown('<h1 class="main-title">🎓 Course Recommender Pro</h1>', unsafe_allow_html=True)
     st.markdown('<p class="subtitle">AI-Powered Personalized Learning Recommendations</p>', unsafe_allow_html=True)
@@ -341,6 +912,19 @@ if df is not None:
     
     # Dataset upload section
     st.sidebar.markdown("### 📂 Data Management")
+    precision = st.sidebar.selectbox(
+        "Model precision:",
+        ["float64", "float32", "int8"],
+        help="Store similarity scores and factor matrices at lower precision to save memory. "
+             "int8 is the smallest at rest but scores slower than float32, since rows are widened per query"
+    )
+    n_shards = st.sidebar.selectbox(
+        "Serving shards:",
+        [1, 2, 4],
+        help="Answer content and collaborative queries from this many catalog shard workers"
+    )
+    models = load_models(df, precision, n_shards)
+    
     uploaded_file = st.sidebar.file_uploader(
         "Upload Dataset (CSV)",
         type=['csv'],
@@ -351,7 +935,7 @@ if df is not None:
         try:
             df_uploaded = pd.read_csv(uploaded_file)
             df = df_uploaded
-            models = load_models(df)
+            models = load_models(df, precision, n_shards)
             st.sidebar.success(f"✅ Uploaded: {len(df):,} rows")
         except Exception as e:
             st.sidebar.error(f"❌ Error: {str(e)}")
@@ -411,11 +995,7 @@ if df is not None:
         
         with col1:
             # Rating Distribution
-            fig = px.histogram(
-                df, x='rating', nbins=50,
-                title='Rating Distribution',
-                color_discrete_sequence=['#667eea']
-            )
+            fig = histogram_figure(df, 'rating', 50, 'Rating Distribution')
             fig.update_layout(
                 plot_bgcolor='rgba(0,0,0,0)',
                 paper_bgcolor='rgba(0,0,0,0)',
@@ -462,7 +1042,7 @@ if df is not None:
         with col4:
             # Price vs Rating
             fig = px.scatter(
-                df.sample(1000), x='course_price', y='rating',
+                stratified_sample(df, 'difficulty_level', 1000), x='course_price', y='rating',
                 title='Course Price vs Rating (Sample)',
                 color='rating',
                 color_continuous_scale='Purples'
@@ -503,15 +1083,16 @@ if df is not None:
         st.markdown("""
         <div class="info-box">
             <b>💡 Choose Your Recommendation Style:</b><br>
-            Select from 6 different recommendation methods to find your perfect courses!
+            Select from 7 different recommendation methods to find your perfect courses!
         </div>
         """, unsafe_allow_html=True)
         
-        # Model selection with 6 options
+        # Model selection with 7 options
         rec_type = st.selectbox(
             "Choose Recommendation Method:",
             [
                 "🔀 Hybrid (Best Overall - Personalized)",
+                "🕒 Session-Based (Recent Activity)",
                 "👥 Collaborative Filtering (Based on Similar Users)",
                 "📚 Content-Based (Similar Courses)",
                 "🔥 Popular Courses (Most Enrolled)",
@@ -521,6 +1102,7 @@ if df is not None:
         )
         
         col1, col2 = st.columns([2, 1])
+        profile = None
         
         with col1:
             # Input selection based on recommendation type
@@ -539,6 +1121,39 @@ if df is not None:
                     models['df_unique']['course_name'] == selected_course_name
                 ]['course_id'].iloc[0]
                 user_id = None
+            elif "Session" in rec_type:
+                user_id = st.number_input(
+                    "Enter User ID:",
+                    min_value=int(df['user_id'].min()),
+                    max_value=int(df['user_id'].max()),
+                    value=int(df['user_id'].iloc[0])
+                )
+                course_id = None
+                
+                # One rolling session per user, seeded from their past courses
+                sessions = st.session_state.setdefault('course_sessions', {})
+                if user_id not in sessions:
+                    sessions[user_id] = new_session()
+                    for past_course in df.loc[df['user_id'] == user_id, 'course_id']:
+                        record_event(sessions[user_id], models['indices'][past_course])
+                session = sessions[user_id]
+                
+                catalog_names = models['df_unique']['course_name']
+                viewed_name = st.selectbox(
+                    "Log a course you just viewed:",
+                    options=catalog_names.unique()
+                )
+                if st.button("➕ Add to Session"):
+                    # One event per view; its copies under other ids are excluded by name
+                    record_event(session, int(np.flatnonzero(catalog_names.values == viewed_name)[0]))
+                
+                recent, _ = session_courses(session)
+                if len(recent):
+                    st.caption("🕒 Recent activity (newest first): " + ", ".join(
+                        models['df_unique']['course_name'].values[recent[:5]]
+                    ))
+                else:
+                    st.info("🆕 No activity yet - log a course to start a session.")
             else:
                 # Input for personalized methods
                 input_method = st.radio(
@@ -555,6 +1170,34 @@ if df is not None:
                         value=int(df['user_id'].iloc[0])
                     )
                     course_id = None
+                    
+                    # Unknown users get a cold-start profile instead of nothing
+                    if not is_known_user(user_id, models):
+                        st.info("🆕 New user! Tell us a little about yourself for instant recommendations.")
+                        catalog_names = models['df_unique']['course_name']
+                        taken_names = st.multiselect(
+                            "Courses you've already taken:",
+                            options=catalog_names.unique()
+                        )
+                        # Unanswered stays None, so the experience signal is skipped
+                        previous_courses = None
+                        if st.checkbox("I know how many courses I've taken"):
+                            previous_courses = st.number_input(
+                                "Number of previous courses taken:",
+                                min_value=0, max_value=100, value=0
+                            )
+                        preferred_level = st.selectbox(
+                            "Preferred difficulty level:",
+                            ["Any"] + sorted(models['df_unique']['difficulty_level'].unique())
+                        )
+                        profile = {
+                            # Every course_id carrying a taken name
+                            'taken_course_ids': models['df_unique'][
+                                catalog_names.isin(taken_names)
+                            ]['course_id'].tolist(),
+                            'previous_courses_taken': previous_courses,
+                            'difficulty_level': None if preferred_level == "Any" else preferred_level
+                        }
                 else:
                     course_names = models['df_unique']['course_name'].values
                     selected_course_name = st.selectbox(
@@ -568,44 +1211,86 @@ if df is not None:
         
         with col2:
             top_n = st.slider("Number of recommendations:", 3, 20, 10)
+            mmr_lambda = st.slider(
+                "Relevance vs. diversity (λ):", 0.0, 1.0, 1.0, 0.1,
+                help="1.0 keeps the model's ranking; lower values re-rank for variety (MMR)"
+            )
+            if "Collaborative" in rec_type:
+                collab_engine = st.radio(
+                    "Collaborative engine:",
+                    ["NMF (Explicit Ratings)", "ALS (Implicit Feedback)"]
+                )
+        
+        # Filters are applied inside every strategy's top-k selection
+        with st.expander("🎛️ Filters"):
+            filter_masks = models['filter_masks']
+            fcol1, fcol2, fcol3, fcol4 = st.columns(4)
+            with fcol1:
+                level = st.selectbox("Difficulty:", ["Any"] + sorted(filter_masks['difficulty_level']))
+            with fcol2:
+                certificate = st.selectbox("Certificate:", ["Any"] + sorted(filter_masks['certification_offered']))
+            with fcol3:
+                material = st.selectbox("Study material:", ["Any"] + sorted(filter_masks['study_material_available']))
+            with fcol4:
+                price_caps = {f"Up to ${cap:.2f}": cap for cap in filter_masks['max_price']}
+                max_price = st.selectbox("Max price:", ["Any"] + list(price_caps))
+        mask = filter_mask(models, {
+            'difficulty_level': None if level == "Any" else level,
+            'certification_offered': None if certificate == "Any" else certificate,
+            'study_material_available': None if material == "Any" else material,
+            'max_price': price_caps.get(max_price)
+        })
         
         if st.button("🚀 Get Recommendations", use_container_width=True):
             with st.spinner("🔮 Generating recommendations..."):
+                # Over-fetch candidates when the list will be re-ranked for diversity
+                fetch_n = top_n if mmr_lambda >= 1.0 else top_n * 5
+                
                 # Get recommendations based on selected method
                 if "Hybrid" in rec_type:
                     if user_id:
-                        recommendations = get_hybrid_recommendations(user_id, models, top_n)
+                        recommendations = get_hybrid_recommendations(user_id, models, fetch_n, profile, mask)
                         model_name = "Hybrid (Personalized for User)"
                     else:
-                        recommendations = get_content_recommendations(course_id, models, top_n)
+                        recommendations = get_content_recommendations(course_id, models, fetch_n, mask)
                         model_name = "Hybrid (Similar to Selected Course)"
                         
+                elif "Session" in rec_type:
+                    recommendations = get_session_recommendations(user_id, models, session, fetch_n, mask)
+                    model_name = "Session-Based"
+                    
                 elif "Collaborative" in rec_type:
-                    if user_id:
-                        recommendations = get_collaborative_recommendations(user_id, models, top_n)
+                    if user_id and "ALS" in collab_engine:
+                        recommendations = get_als_recommendations(user_id, models, fetch_n, profile, mask)
+                        model_name = "Collaborative Filtering (ALS)"
+                    elif user_id:
+                        recommendations = get_collaborative_recommendations(user_id, models, fetch_n, profile, mask)
                         model_name = "Collaborative Filtering"
                     else:
-                        recommendations = get_collaborative_recommendations(user_id, models, top_n) if user_id else pd.DataFrame()
+                        recommendations = get_collaborative_recommendations(user_id, models, fetch_n) if user_id else pd.DataFrame()
                         model_name = "Collaborative Filtering"
                         
                 elif "Content" in rec_type:
-                    recommendations = get_content_recommendations(course_id, models, top_n)
+                    recommendations = get_content_recommendations(course_id, models, fetch_n, mask)
                     model_name = "Content-Based"
                     
                 elif "Popular" in rec_type:
-                    recommendations = get_popular_recommendations(models['df_unique'], top_n)
+                    recommendations = get_popular_recommendations(models['df_unique'], fetch_n, mask)
                     model_name = "Popular Courses"
                     
                 elif "Trending" in rec_type:
-                    recommendations = get_trending_recommendations(df, top_n)
+                    recommendations = get_trending_recommendations(df, fetch_n, mask)
                     model_name = "Trending Courses"
                     
                 else:  # Top Rated
-                    recommendations = get_top_rated_recommendations(models['df_unique'], top_n)
+                    recommendations = get_top_rated_recommendations(models['df_unique'], fetch_n, mask)
                     model_name = "Top Rated Courses"
                 
+                recommendations = mmr_rerank(recommendations, models, top_n, mmr_lambda)
+                
                 if not recommendations.empty:
                     st.success(f"✅ Found {len(recommendations)} recommendations using {model_name}!")
+                    st.caption(f"🎨 List diversity: {intra_list_diversity(recommendations, models) * 100:.1f}%")
                     
                     # Display recommendations beautifully
                     for idx, row in recommendations.iterrows():
@@ -618,6 +1303,18 @@ if df is not None:
                             score = row['estimated_rating']
                             score_label = f"Predicted: {score:.2f}/5.0"
                             score_color = "#4CAF50" if score >= 4.0 else "#FFC107"
+                        elif 'als_score' in row:
+                            score = row['als_score']
+                            score_label = f"Affinity: {score:.3g}"
+                            score_color = "#6C5CE7"
+                        elif 'cold_start_score' in row:
+                            score = row['cold_start_score']
+                            score_label = f"New-User Match: {score*100:.1f}%"
+                            score_color = "#00B894"
+                        elif 'session_score' in row:
+                            score = row['session_score']
+                            score_label = f"Session Match: {score*100:.1f}%"
+                            score_color = "#E17055"
                         elif 'hybrid_score' in row:
                             score = row['hybrid_score']
                             score_label = f"Match: {score*100:.1f}%"
@@ -693,7 +1390,14 @@ if df is not None:
             metrics_df.style.background_gradient(cmap='Purples', subset=['RMSE', 'MAE', 'Precision@10']),
             use_container_width=True
         )
-        
+
+        # Measured training time of the collaborative engines (trains them if not cached yet)
+        st.markdown("### ⏱️ Collaborative Engine Training Time")
+        if st.checkbox("Show measured training time (trains NMF and ALS on first use)"):
+            time_col1, time_col2 = st.columns(2)
+            time_col1.metric("NMF", f"{models['nmf']['training_seconds']:.2f} s")
+            time_col2.metric("ALS (implicit)", f"{models['als']['training_seconds']:.2f} s")
+
         # Visualizations
         col1, col2 = st.columns(2)
         
@@ -827,11 +1531,7 @@ if df is not None:
             st.markdown("### 👥 User Behavior Analysis")
             
             # Previous courses taken distribution
-            fig = px.histogram(
-                df, x='previous_courses_taken', nbins=20,
-                title='Distribution of Previous Courses Taken',
-                color_discrete_sequence=['#667eea']
-            )
+            fig = histogram_figure(df, 'previous_courses_taken', 20, 'Distribution of Previous Courses Taken')
             fig.update_layout(
                 plot_bgcolor='rgba(0,0,0,0)',
                 paper_bgcolor='rgba(0,0,0,0)'
@@ -839,11 +1539,10 @@ if df is not None:
             st.plotly_chart(fig, use_container_width=True)
             
             # Time spent analysis
-            fig = px.box(
-                df, x='difficulty_level', y='time_spent_hours',
-                title='Time Spent by Difficulty Level',
-                color='difficulty_level',
-                color_discrete_sequence=['#667eea', '#764ba2', '#f093fb']
+            fig = box_figure(
+                df, 'difficulty_level', 'time_spent_hours',
+                'Time Spent by Difficulty Level',
+                ['#667eea', '#764ba2', '#f093fb']
             )
             fig.update_layout(
                 showlegend=False,
@@ -876,6 +1575,9 @@ if df is not None:
             )
             st.plotly_chart(fig, use_container_width=True)
     
+    # Models are loaded lazily, so report memory after the page has run
+    st.sidebar.caption(f"🧠 Model memory for this page ({models['precision']}): {model_nbytes(models) / 1e6:.1f} MB")
+    
     # Footer
     st.markdown("---")
     st.markdown("""
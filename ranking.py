@@ -0,0 +1,62 @@
+"""
+Scoring and top-k selection shared by the dashboard and the shard workers
+
+Factor matrices are stored as {'values', 'scales'}: float64 or float32 values
+with no scales, or int8 values with one float32 scale per row.
+"""
+
+import numpy as np
+
+
+def top_k_indices(scores, k, mask=None):
+    """Return positions of the k highest scores, best first, restricted to `mask`"""
+    if mask is not None:
+        scores = np.where(mask, scores, -np.inf)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=int)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    # Excluded positions (-inf) only surface when fewer than k remain
+    return top[np.isfinite(scores[top])]
+
+
+def quantize_rows(matrix, precision='float64'):
+    """Store a dense matrix as float64, float32 or int8 with one scale per row"""
+    matrix = np.asarray(matrix)
+    if precision == 'int8':
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        values = np.rint(matrix / scales[:, None]).astype(np.int8)
+        return {'values': values, 'scales': scales.astype(np.float32)}
+    return {'values': matrix.astype(precision, copy=False), 'scales': None}
+
+
+def dequantize_rows(quantized, rows):
+    """Read back one row (or an array of rows) of a quantized matrix as floats"""
+    values = quantized['values'][rows]
+    if quantized['scales'] is None:
+        return values
+    return values.astype(np.float32) * quantized['scales'][rows][..., None]
+
+
+def score_rows(quantized, vector, block_size=2048):
+    """Dot every stored row with `vector`, applying int8 row scales after the product.
+
+    numpy casts int8 rows to float32 before a product, so int8 is scored in row
+    blocks to keep that copy at block_size rows instead of the whole matrix.
+    """
+    values = quantized['values']
+    if quantized['scales'] is None:
+        return values @ vector.astype(values.dtype)
+    vector = vector.astype(np.float32)
+    scores = np.empty(len(values), dtype=np.float32)
+    for start in range(0, len(values), block_size):
+        scores[start:start + block_size] = values[start:start + block_size] @ vector
+    return scores * quantized['scales']
+
+
+def quantized_nbytes(quantized):
+    """Memory held by a quantized matrix, scales included"""
+    scales = quantized['scales']
+    return quantized['values'].nbytes + (0 if scales is None else scales.nbytes)
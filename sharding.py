@@ -0,0 +1,187 @@
+"""
+Sharded serving of the course catalog
+
+Course factors and content vectors are split into contiguous row ranges, one
+per worker process. Each matrix is sent to the workers under a name when it
+is first needed. A coordinator scatters each query to every shard, each
+shard returns its own top-k, and the coordinator merges them.
+
+Run a worker on another machine, next to a copy of ranking.py, with:
+    SHARD_AUTHKEY=<secret> python sharding.py --host 0.0.0.0 --port 6001
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import weakref
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+from scipy.sparse import issparse
+
+from ranking import score_rows, top_k_indices
+
+
+def shard_top_k(scores, top_n, offset, mask=None, exclude=()):
+    """Top-k of one shard's scores, returned as (global positions, scores)"""
+    scores = np.array(scores, dtype=np.float64)
+    local = np.asarray(exclude, dtype=int) - offset
+    scores[local[(local >= 0) & (local < len(scores))]] = -np.inf
+    top = top_k_indices(scores, top_n, mask)
+    return offset + top, scores[top]
+
+
+def score_shard(rows, query):
+    """Score every course in a shard's rows against a query"""
+    if issparse(rows):
+        # Query is (column indices, values) of a sparse content vector; the
+        # shard keeps its vectors column-major so this only reads those columns
+        columns, values = query
+        return rows[:, columns] @ values
+    return score_rows(rows, np.asarray(query))
+
+
+def run_worker(host='localhost', port=0, authkey=None):
+    """Serve one shard: load it, then answer top-k queries until the coordinator leaves"""
+    authkey = authkey or os.environ['SHARD_AUTHKEY'].encode()
+    with Listener((host, port), authkey=authkey) as listener:
+        # The coordinator reads this line to learn the port that was bound
+        print(f"READY {listener.address[1]}", flush=True)
+        with listener.accept() as conn:
+            # name -> (offset of the first row, rows)
+            matrices = {}
+            while True:
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    break
+                command = message[0]
+                if command == 'load':
+                    _, name, offset, rows = message
+                    matrices[name] = (offset, rows)
+                    conn.send(('ok', name))
+                elif command == 'top_k':
+                    _, name, query, top_n, mask, exclude = message
+                    offset, rows = matrices[name]
+                    conn.send(shard_top_k(score_shard(rows, query), top_n, offset, mask, exclude))
+                elif command == 'close':
+                    break
+
+
+def _stop_workers(connections, processes):
+    """Ask workers to exit, and kill any that don't"""
+    for conn in connections:
+        try:
+            conn.send(('close',))
+            conn.close()
+        except OSError:
+            pass
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+class ShardCoordinator:
+    """Scatter queries to shard workers and merge their top-k answers"""
+
+    def __init__(self, addresses, authkey, processes=()):
+        self.connections = []
+        self.processes = list(processes)
+        # Workers are stopped by close(), when the coordinator is garbage
+        # collected, or at interpreter exit, whichever comes first
+        self._finalizer = weakref.finalize(self, _stop_workers, self.connections, self.processes)
+        self.connections.extend(Client(address, authkey=authkey) for address in addresses)
+        self.bounds = []
+        self.loaded = set()
+        # Replies are read back in send order on shared connections, so only
+        # one thread may scatter/gather at a time
+        self.lock = threading.Lock()
+
+    @classmethod
+    def start_local(cls, n_shards):
+        """Start n_shards worker processes on localhost and connect to them"""
+        authkey = os.urandom(16).hex().encode()
+        env = dict(os.environ, SHARD_AUTHKEY=authkey.decode())
+        processes, addresses = [], []
+        try:
+            for _ in range(n_shards):
+                process = subprocess.Popen(
+                    [sys.executable, os.path.abspath(__file__), '--port', '0'],
+                    stdout=subprocess.PIPE, env=env, text=True
+                )
+                processes.append(process)
+                ready = process.stdout.readline().split()
+                if len(ready) != 2 or ready[0] != 'READY':
+                    raise RuntimeError(
+                        f"Shard worker exited before it was ready (exit code {process.wait()})"
+                    )
+                addresses.append(('localhost', int(ready[1])))
+            return cls(addresses, authkey, processes)
+        except BaseException:
+            for process in processes:
+                process.kill()
+                process.wait()
+            raise
+
+    @property
+    def n_shards(self):
+        return len(self.connections)
+
+    def load(self, name, matrix):
+        """Partition a matrix's course rows across the workers under `name`.
+
+        matrix is either a sparse (courses x features) matrix, queried with a
+        sparse vector, or quantized factors {'values', 'scales'} with one row
+        per course, queried with a dense vector. All matrices must have the same
+        number of courses.
+        """
+        n_courses = matrix.shape[0] if issparse(matrix) else len(matrix['values'])
+        edges = np.linspace(0, n_courses, self.n_shards + 1).astype(int)
+        with self.lock:
+            self.bounds = list(zip(edges[:-1], edges[1:]))
+            for conn, (start, stop) in zip(self.connections, self.bounds):
+                if issparse(matrix):
+                    rows = matrix[start:stop].tocsc()
+                else:
+                    rows = {
+                        'values': matrix['values'][start:stop],
+                        'scales': None if matrix['scales'] is None else matrix['scales'][start:stop]
+                    }
+                conn.send(('load', name, start, rows))
+            for conn in self.connections:
+                conn.recv()
+            self.loaded.add(name)
+
+    def top_k(self, name, query, top_n, mask=None, exclude=()):
+        """Scatter a query, gather each shard's top-k and merge them, best first"""
+        if issparse(query):
+            query = query.tocsr()
+            query = (query.indices, query.data)
+        exclude = np.asarray(exclude, dtype=int)
+        with self.lock:
+            for conn, (start, stop) in zip(self.connections, self.bounds):
+                shard_mask = None if mask is None else mask[start:stop]
+                shard_exclude = exclude[(exclude >= start) & (exclude < stop)]
+                conn.send(('top_k', name, query, top_n, shard_mask, shard_exclude))
+            answers = [conn.recv() for conn in self.connections]
+        positions = np.concatenate([a[0] for a in answers])
+        scores = np.concatenate([a[1] for a in answers])
+        best = np.argsort(-scores, kind='stable')[:top_n]
+        return positions[best], scores[best]
+
+    def close(self):
+        """Stop the workers"""
+        self._finalizer()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve one shard of the course catalog")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=0)
+    args = parser.parse_args()
+    run_worker(args.host, args.port)
@@ -0,0 +1,109 @@
+"""
+Sharded serving: local worker processes must return the same top-k as the
+in-process engine, filters and exclusions included.
+
+Run with:
+    python -m pytest test_sharding.py
+"""
+
+import threading
+
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+from sklearn.preprocessing import normalize
+
+from ranking import quantize_rows, score_rows, top_k_indices
+from sharding import ShardCoordinator
+
+N_COURSES = 1001  # not a multiple of the shard count
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    rng = np.random.default_rng(0)
+    return {
+        'content': normalize(sparse_random(N_COURSES, 500, density=0.02, format='csr', random_state=0)),
+        'factors': rng.standard_normal((N_COURSES, 20)),
+        'mask': rng.random(N_COURSES) < 0.5,
+        'queries': rng.standard_normal((20, 20))
+    }
+
+
+@pytest.fixture(scope='module', params=[2, 4])
+def shards(request, catalog):
+    coordinator = ShardCoordinator.start_local(request.param)
+    coordinator.load('content', catalog['content'])
+    for precision in ['float64', 'int8']:
+        coordinator.load(f'als-{precision}', quantize_rows(catalog['factors'], precision))
+    yield coordinator
+    coordinator.close()
+
+
+def expected_top_k(scores, top_n, mask=None, exclude=()):
+    scores = np.asarray(scores, dtype=np.float64).copy()
+    scores[list(exclude)] = -np.inf
+    top = top_k_indices(scores, top_n, mask)
+    return top, scores[top]
+
+
+@pytest.mark.parametrize('precision', ['float64', 'int8'])
+def test_factor_top_k_matches_in_process(shards, catalog, precision):
+    factors = quantize_rows(catalog['factors'], precision)
+    exclude = [0, 250, 500, 750, 1000]
+    for query in catalog['queries']:
+        for mask in [None, catalog['mask']]:
+            positions, scores = shards.top_k(f'als-{precision}', query, 10, mask, exclude)
+            expected, expected_scores = expected_top_k(score_rows(factors, query), 10, mask, exclude)
+            np.testing.assert_array_equal(positions, expected)
+            np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+
+
+def test_content_top_k_matches_in_process(shards, catalog):
+    content = catalog['content']
+    for idx in [0, 333, 667, 1000]:
+        similarities = (content @ content[idx].T).toarray().ravel()
+        for mask in [None, catalog['mask']]:
+            positions, scores = shards.top_k('content', content[idx], 10, mask, exclude=[idx])
+            expected, expected_scores = expected_top_k(similarities, 10, mask, [idx])
+            assert idx not in positions
+            np.testing.assert_allclose(scores, expected_scores)
+            # Zero similarities tie, so compare positions only where scores are distinct
+            distinct = expected_scores > 0
+            np.testing.assert_array_equal(positions[distinct], expected[distinct])
+
+
+def test_top_k_with_fewer_allowed_courses_than_k(shards, catalog):
+    mask = np.zeros(N_COURSES, dtype=bool)
+    mask[[3, 400, 999]] = True
+    positions, _ = shards.top_k('als-float64', catalog['queries'][0], 10, mask, exclude=[400])
+    assert sorted(positions) == [3, 999]
+
+
+def test_concurrent_queries_get_their_own_answers(shards, catalog):
+    factors = quantize_rows(catalog['factors'])
+    wrong = []
+
+    def run(queries):
+        for query in queries:
+            positions, _ = shards.top_k('als-float64', query, 10)
+            if not np.array_equal(positions, expected_top_k(score_rows(factors, query), 10)[0]):
+                wrong.append(query)
+
+    threads = [
+        threading.Thread(target=run, args=(catalog['queries'][i::4],), daemon=True) for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    # Interleaved sends and receives can also deadlock rather than mix up answers
+    assert not any(thread.is_alive() for thread in threads)
+    assert not wrong
+
+
+def test_close_stops_workers():
+    coordinator = ShardCoordinator.start_local(2)
+    processes = list(coordinator.processes)
+    coordinator.close()
+    assert all(process.poll() is not None for process in processes)